@@ -17,7 +17,6 @@
 
 import argparse
 import logging
-import silver_platter  # noqa: F401
 import sys
 from typing import Optional, List, Callable, Dict
 from . import (
@@ -81,7 +80,7 @@ def login_main(argv: List[str]) -> Optional[int]:
         lp_api.connect_launchpad(lp_service_root, version="devel")
         return None
     else:
-        logging.exception("Unknown hoster %r.", hoster)
+        logging.error("Unknown hoster %r.", hoster)
         return 1
 
 
@@ -117,11 +117,11 @@ def script_runner(  # noqa: C901
             env['SVP_RESUME'] = os.path.join(td, 'resume-metadata.json')
             with open(env['SVP_RESUME'], 'w') as f:
                 json.dump(resume_metadata, f)
-        p = subprocess.Popen(
+        p = subprocess.run(
             script, cwd=local_tree.abspath(subpath), stdout=subprocess.PIPE,
-            shell=isinstance(script, str),
+            stdin=subprocess.DEVNULL, shell=isinstance(script, str),
             env=env)
-        (description_encoded, err) = p.communicate(b"")
+        description_encoded = p.stdout
         try:
             with open(env['SVP_RESULT'], 'r') as f:
                 try:
@@ -161,7 +161,7 @@ def script_runner(  # noqa: C901
     if new_revision == last_revision:
         raise ScriptMadeNoChanges()
     result.old_revision = last_revision
-    result.new_revision = local_tree.last_revision()
+    result.new_revision = new_revision
     return result
 
 
@@ -206,7 +206,7 @@ def main(argv: List[str]) -> Optional[int]:  # noqa: C901
     elif recipe.command:
         command = recipe.command
     else:
-        logging.exception('No command specified.')
+        logging.error('No command specified.')
         return 1
 
     local_tree, subpath = WorkingTree.open_containing('.')
@@ -227,7 +227,7 @@ def main(argv: List[str]) -> Optional[int]:  # noqa: C901
                     args.verify_command, shell=True, cwd=local_tree.abspath(subpath)
                 )
             except subprocess.CalledProcessError:
-                logging.exception("Verify command failed.")
+                logging.error("Verify command failed.")
                 return 1
     except Exception:
         reset_tree(local_tree, subpath)
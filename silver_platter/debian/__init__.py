@@ -61,6 +61,7 @@ from ..utils import (
 __all__ = [
     "add_changelog_entry",
     "apt_get_source_package",
+    "get_apt_source_records",
     "guess_update_changelog",
     "source_package_vcs",
     "build",
@@ -153,6 +154,36 @@ class NoAptSources(Exception):
     """No apt sources were configured."""
 
 
+_apt_source_records = None
+
+
+def get_apt_source_records():
+    """Get a (shared) apt source records parser.
+
+    Loading the source records is expensive, so the parser is created once and
+    rewound for each caller.
+
+    Returns:
+      An `apt_pkg.SourceRecords` object, positioned at the first record
+    """
+    global _apt_source_records
+    import apt_pkg
+
+    if _apt_source_records is None:
+        apt_pkg.init()
+        try:
+            _apt_source_records = apt_pkg.SourceRecords()
+        except apt_pkg.Error as e:
+            if e.args[0] == (
+                "E:You must put some 'deb-src' URIs in your sources.list"
+            ):
+                raise NoAptSources()
+            raise
+    else:
+        _apt_source_records.restart()
+    return _apt_source_records
+
+
 def apt_get_source_package(name: str) -> Deb822:
     """Get source package metadata.
 
@@ -161,16 +192,7 @@ def apt_get_source_package(name: str) -> Deb822:
     Returns:
       A `Deb822` object
     """
-    import apt_pkg
-
-    apt_pkg.init()
-
-    try:
-        sources = apt_pkg.SourceRecords()
-    except apt_pkg.Error as e:
-        if e.args[0] == ("E:You must put some 'deb-src' URIs in your sources.list"):
-            raise NoAptSources()
-        raise
+    sources = get_apt_source_records()
 
     by_version: Dict[str, Deb822] = {}
     while sources.lookup(name):
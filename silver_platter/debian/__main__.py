@@ -26,10 +26,17 @@ import sys
 from . import (
     apply as debian_apply,
     run as debian_run,
-    uploader as debian_uploader,
     )
 
 
+def upload_pending_main(argv: List[str]) -> Optional[int]:
+    # The uploader pulls in a fair chunk of brz-debian (import_dsc, release,
+    # gpg); only load it when it's actually going to be used.
+    from .uploader import main as uploader_main
+
+    return uploader_main(argv)
+
+
 def main(argv: Optional[List[str]] = None) -> Optional[int]:
     import breezy
 
@@ -38,7 +45,7 @@ def main(argv: Optional[List[str]] = None) -> Optional[int]:
     from ..__main__ import subcommands as main_subcommands
 
     subcommands: Dict[str, Callable[[List[str]], Optional[int]]] = {
-        "upload-pending": debian_uploader.main,
+        "upload-pending": upload_pending_main,
         "apply": debian_apply.main,
         "run": debian_run.main,
     }
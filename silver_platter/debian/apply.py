@@ -181,10 +181,10 @@ def script_runner(   # noqa: C901
             env['SVP_RESUME'] = os.path.join(td, 'resume-metadata.json')
             with open(env['SVP_RESUME'], 'w') as f:
                 json.dump(resume_metadata, f)
-        p = subprocess.Popen(
+        p = subprocess.run(
             script, cwd=local_tree.abspath(subpath), stdout=subprocess.PIPE,
-            shell=isinstance(script, str), env=env)
-        (description_encoded, err) = p.communicate(b"")
+            stdin=subprocess.DEVNULL, shell=isinstance(script, str), env=env)
+        description_encoded = p.stdout
         try:
             with open(env['SVP_RESULT'], 'r') as f:
                 try:
@@ -321,7 +321,7 @@ def main(argv: List[str]) -> Optional[int]:  # noqa: C901
     elif recipe and recipe.command:
         command = recipe.command
     else:
-        logging.exception('No command or recipe specified.')
+        logging.error('No command or recipe specified.')
         return 1
 
     local_tree, subpath = WorkingTree.open_containing('.')
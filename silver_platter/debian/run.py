@@ -19,16 +19,14 @@
 
 import argparse
 import logging
-import os
 import sys
 from typing import Optional, List
 
-from breezy import osutils
 from breezy import propose as _mod_propose
+from breezy.propose import Hoster
+from breezy.transport import Transport
 from breezy.urlutils import InvalidURL
 
-import silver_platter  # noqa: F401
-
 from . import (
     DEFAULT_BUILDER,
     BuildFailedError,
@@ -56,6 +54,7 @@ from ..publish import (
     SUPPORTED_MODES,
     InsufficientChangesForNewProposal,
 )
+from ..run import derived_branch_name
 from ..utils import (
     open_branch,
     BranchMissing,
@@ -65,10 +64,6 @@ from ..utils import (
 )
 
 
-def derived_branch_name(script: str) -> str:
-    return os.path.splitext(osutils.basename(script.split(" ")[0]))[0]
-
-
 def apply_and_publish(  # noqa: C901
         url: str, name: str, command: str, mode: str,
         subpath: str = '',
@@ -80,9 +75,11 @@ def apply_and_publish(  # noqa: C901
         get_commit_message=None, get_description=None,
         build_verify=False, builder=DEFAULT_BUILDER, install=False,
         build_target_dir=None, update_changelog: Optional[bool] = None,
-        preserve_repositories: bool = False):
+        preserve_repositories: bool = False,
+        possible_hosters: Optional[List[Hoster]] = None,
+        possible_transports: Optional[List[Transport]] = None):
     try:
-        main_branch = open_branch(url)
+        main_branch = open_branch(url, possible_transports=possible_transports)
     except (BranchUnavailable, BranchMissing, BranchUnsupported) as e:
         logging.fatal("%s: %s", url, e)
         return 1
@@ -93,7 +90,7 @@ def apply_and_publish(  # noqa: C901
     overwrite = False
 
     try:
-        hoster = get_hoster(main_branch)
+        hoster = get_hoster(main_branch, possible_hosters=possible_hosters)
     except UnsupportedHoster as e:
         if mode != "push":
             raise
@@ -164,7 +161,7 @@ def apply_and_publish(  # noqa: C901
                 existing_proposal=existing_proposal,
             )
         except UnsupportedHoster as e:
-            logging.exception(
+            logging.error(
                 "No known supported hoster for %s. Run 'svp login'?",
                 full_branch_url(e.branch),
             )
@@ -173,7 +170,7 @@ def apply_and_publish(  # noqa: C901
             logging.info('Insufficient changes for a new merge proposal')
             return 0
         except _mod_propose.HosterLoginRequired as e:
-            logging.exception(
+            logging.error(
                 "Credentials for hosting site at %r missing. " "Run 'svp login'?",
                 e.hoster.base_url,
             )
@@ -312,7 +309,7 @@ def main(argv: List[str]) -> Optional[int]:  # noqa: C901
     elif recipe and recipe.command:
         command = recipe.command
     else:
-        logging.exception('No command specified.')
+        logging.error('No command specified.')
         return 1
 
     if args.name is not None:
@@ -355,6 +352,10 @@ def main(argv: List[str]) -> Optional[int]:  # noqa: C901
 
     retcode = 0
 
+    # Candidates often share a hosting site; reuse hosters and connections.
+    possible_hosters: List[Hoster] = []
+    possible_transports: List[Transport] = []
+
     for candidate in candidates:
         if apply_and_publish(
                 candidate.url, name=name, command=command, mode=args.mode,
@@ -368,7 +369,9 @@ def main(argv: List[str]) -> Optional[int]:  # noqa: C901
                 build_verify=args.build_verify, builder=args.builder,
                 install=args.install, build_target_dir=args.build_target_dir,
                 update_changelog=args.update_changelog,
-                preserve_repositories=args.preserve_repositories):
+                preserve_repositories=args.preserve_repositories,
+                possible_hosters=possible_hosters,
+                possible_transports=possible_transports):
             retcode = 1
 
     return retcode
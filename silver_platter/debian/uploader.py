@@ -17,12 +17,12 @@
 
 """Support for uploading packages."""
 
-import silver_platter  # noqa: F401
-
+from contextlib import nullcontext
 import datetime
 from email.utils import parseaddr
 import logging
 import os
+import re
 import subprocess
 import sys
 import tempfile
@@ -33,12 +33,12 @@ from debmutate.changelog import (
     ChangelogParseError,
     changeblock_ensure_first_line,
 )
-from debmutate.control import ControlEditor
 
 from breezy import gpg
-from breezy.config import extract_email_address
-from breezy.errors import NoSuchTag, PermissionDenied
+from breezy.config import extract_email_address, GlobalStack
+from breezy.errors import NoSuchRevision, NoSuchTag, PermissionDenied
 from breezy.commit import NullCommitReporter
+from breezy.revision import NULL_REVISION
 from breezy.plugins.debian.builder import BuildFailedError
 from breezy.plugins.debian.cmds import _build_helper
 from breezy.plugins.debian.import_dsc import (
@@ -56,10 +56,12 @@ from breezy.plugins.debian.util import (
 )
 from breezy.plugins.debian.upstream import MissingUpstreamTarball
 
-from debian.changelog import get_maintainer
+from debian.changelog import Changelog, get_maintainer
+from debian.deb822 import Deb822
 
 from . import (
     apt_get_source_package,
+    get_apt_source_records,
     source_package_vcs,
     split_vcs_url,
     Workspace,
@@ -73,18 +75,41 @@ from ..utils import (
     BranchMissing,
     BranchUnsupported,
     BranchRateLimited,
+    _convert_exception,
 )
 
 
+_udd_connection = None
+
+
 def connect_udd_mirror():
+    """Connect to the public UDD mirror.
+
+    The connection is kept around and reused by later calls, since setting
+    it up involves a fair amount of latency.
+    """
+    global _udd_connection
     import psycopg2
+    from psycopg2.extensions import (
+        TRANSACTION_STATUS_INERROR,
+        TRANSACTION_STATUS_UNKNOWN,
+    )
 
-    return psycopg2.connect(
+    if _udd_connection is not None and not _udd_connection.closed:
+        if _udd_connection.get_transaction_status() not in (
+            TRANSACTION_STATUS_INERROR,
+            TRANSACTION_STATUS_UNKNOWN,
+        ):
+            return _udd_connection
+        # Left in a failed transaction, or the connection broke; start afresh.
+        _udd_connection.close()
+    _udd_connection = psycopg2.connect(
         database="udd",
         user="udd-mirror",
         password="udd-mirror",
         host="udd-mirror.debian.net",
     )
+    return _udd_connection
 
 
 def debsign(path, keyid=None):
@@ -185,16 +210,87 @@ def check_revision(rev, min_commit_age, allowed_committers):
         raise CommitterNotAllowed(committer_email, allowed_committers)
 
 
+def _get_tip_revision(branch):
+    """Return the tip revision of a branch, or None if it has none."""
+    revid = branch.last_revision()
+    if revid == NULL_REVISION:
+        return None
+    try:
+        return branch.repository.get_revision(revid)
+    except NoSuchRevision:
+        return None
+    except Exception as e:
+        converted = _convert_exception(branch.user_url, e)
+        if converted is None:
+            raise
+        raise converted
+
+
 def find_last_release_revid(branch, version):
     db = DistributionBranch(branch, None)
     return db.revid_of_version(version)
 
 
-def get_maintainer_keys(context):
-    for key in context.keylist(source="/usr/share/keyrings/debian-keyring.gpg"):
-        yield key.fpr
+DEBIAN_KEYRING_PATH = "/usr/share/keyrings/debian-keyring.gpg"
+
+
+def _maintainer_keys_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "silver-platter")
+
+
+def _maintainer_keys_cache_path(keyring_path):
+    try:
+        st = os.stat(keyring_path)
+    except FileNotFoundError:
+        return None
+    return os.path.join(
+        _maintainer_keys_cache_dir(),
+        "%s-%d-%d.fprs"
+        % (os.path.basename(keyring_path), st.st_mtime_ns, st.st_size),
+    )
+
+
+def _write_maintainer_keys_cache(cache_path, keys):
+    cache_dir, cache_name = os.path.split(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=cache_dir, delete=False) as f:
+        try:
+            f.writelines(key + "\n" for key in keys)
+            f.close()
+            os.replace(f.name, cache_path)
+        except BaseException:
+            os.unlink(f.name)
+            raise
+    # Drop the fingerprints cached for earlier versions of the keyring.
+    stale = re.compile(
+        re.escape(cache_name.rsplit("-", 2)[0]) + r"-[0-9]+-[0-9]+\.fprs")
+    for name in os.listdir(cache_dir):
+        if name != cache_name and stale.fullmatch(name):
+            os.unlink(os.path.join(cache_dir, name))
+
+
+def get_maintainer_keys(context, keyring_path=DEBIAN_KEYRING_PATH):
+    # Listing the full keyring takes a long time, so keep the fingerprints
+    # around until the keyring changes.
+    cache_path = _maintainer_keys_cache_path(keyring_path)
+    if cache_path is not None:
+        try:
+            with open(cache_path, "r") as f:
+                return f.read().splitlines()
+        except OSError:
+            pass
+    keys = []
+    for key in context.keylist(source=keyring_path):
+        keys.append(key.fpr)
         for subkey in key.subkeys:
-            yield subkey.keyid
+            keys.append(subkey.keyid)
+    if cache_path is not None:
+        try:
+            _write_maintainer_keys_cache(cache_path, keys)
+        except OSError as e:
+            logging.debug("Unable to cache maintainer keys: %s", e)
+    return keys
 
 
 class GbpDchFailed(Exception):
@@ -210,8 +306,25 @@ def prepare_upload_package(  # noqa: C901
     gpg_strategy=None,
     min_commit_age=None,
     allowed_committers=None,
+    target_dir=None,
 ):
-    if local_tree.has_filename(os.path.join(subpath, "debian/gbp.conf")):
+    debian_path = os.path.join(subpath, "debian")
+    changelog_path = os.path.join(debian_path, "changelog")
+    with local_tree.lock_read():
+        try:
+            last_release_revid = find_last_release_revid(
+                local_tree.branch, last_uploaded_version
+            )
+        except NoSuchTag:
+            last_release_revid = None
+        tip_revid = local_tree.branch.last_revision()
+    if last_release_revid == tip_revid:
+        # Nothing has been committed since the last upload; don't bother
+        # running gbp dch or parsing the changelog.
+        raise NoUnuploadedChanges(last_uploaded_version)
+    # The workspace is a fresh checkout, so checking on disk is equivalent
+    # to (and cheaper than) asking the tree.
+    if os.path.exists(local_tree.abspath(os.path.join(debian_path, "gbp.conf"))):
         try:
             subprocess.check_call(
                 ["gbp", "dch", "--ignore-branch"], cwd=local_tree.abspath(".")
@@ -232,60 +345,64 @@ def prepare_upload_package(  # noqa: C901
             raise LastUploadMoreRecent(last_uploaded_version, previous_version_in_branch)
 
     logging.info("Checking revisions since %s" % last_uploaded_version)
+    if last_release_revid is None:
+        raise LastReleaseRevisionNotFound(pkg, last_uploaded_version)
     with local_tree.lock_read():
-        try:
-            last_release_revid = find_last_release_revid(
-                local_tree.branch, last_uploaded_version
-            )
-        except NoSuchTag:
-            raise LastReleaseRevisionNotFound(pkg, last_uploaded_version)
         graph = local_tree.branch.repository.get_graph()
-        revids = list(
-            graph.iter_lefthand_ancestry(
-                local_tree.branch.last_revision(), [last_release_revid]
-            )
-        )
+        revids = list(graph.iter_lefthand_ancestry(tip_revid, [last_release_revid]))
         if not revids:
             logging.info("No pending changes")
             return
         if gpg_strategy:
             logging.info("Verifying GPG signatures...")
-            count, result, all_verifiables = gpg.bulk_verify_signatures(
-                local_tree.branch.repository, revids, gpg_strategy
-            )
-            for revid, code, key in result:
+            # Unlike gpg.bulk_verify_signatures, this stops at the first
+            # revision without a valid signature.
+            for revid, code, key in (
+                local_tree.branch.repository.verify_revision_signatures(
+                    revids, gpg_strategy
+                )
+            ):
                 if code != gpg.SIGNATURE_VALID:
                     raise Exception("No valid GPG signature on %r: %d" % (revid, code))
-        for revid, rev in local_tree.branch.repository.iter_revisions(revids):
-            if rev is not None:
-                check_revision(rev, min_commit_age, allowed_committers)
+        if allowed_committers:
+            for revid, rev in local_tree.branch.repository.iter_revisions(revids):
+                if rev is not None:
+                    check_revision(rev, min_commit_age, allowed_committers)
+        elif min_commit_age is not None:
+            # Only the age of the most recent revision matters.
+            check_revision(
+                local_tree.branch.repository.get_revision(revids[0]),
+                min_commit_age,
+                None,
+            )
 
         if cl.distributions != "UNRELEASED":
             raise NoUnreleasedChanges(cl.version)
     qa_upload = False
     team_upload = False
-    control_path = local_tree.abspath(os.path.join(subpath, "debian/control"))
-    with ControlEditor(control_path) as e:
-        maintainer = parseaddr(e.source["Maintainer"])
-        if maintainer[1] == "packages@qa.debian.org":
-            qa_upload = True
-        # TODO(jelmer): Check whether this is a team upload
-        # TODO(jelmer): determine whether this is a NMU upload
+    control_path = local_tree.abspath(os.path.join(debian_path, "control"))
+    with open(control_path, "rb") as f:
+        source = Deb822(f)
+    maintainer = parseaddr(source["Maintainer"])
+    if maintainer[1] == "packages@qa.debian.org":
+        qa_upload = True
+    # TODO(jelmer): Check whether this is a team upload
+    # TODO(jelmer): determine whether this is a NMU upload
     if qa_upload or team_upload:
-        changelog_path = local_tree.abspath(os.path.join(subpath, "debian/changelog"))
-        with ChangelogEditor(changelog_path) as e:
+        with ChangelogEditor(local_tree.abspath(changelog_path)) as e:
             if qa_upload:
                 changeblock_ensure_first_line(e[0], "QA upload.")
             elif team_upload:
                 changeblock_ensure_first_line(e[0], "Team upload.")
         local_tree.commit(
-            specific_files=[os.path.join(subpath, "debian/changelog")],
+            specific_files=[changelog_path],
             message="Mention QA Upload.",
             allow_pointless=False,
             reporter=NullCommitReporter(),
         )
     tag_name = release(local_tree, subpath)
-    target_dir = tempfile.mkdtemp()
+    if target_dir is None:
+        target_dir = tempfile.mkdtemp()
     builder = builder.replace("${LAST_VERSION}", last_uploaded_version)
     target_changes = _build_helper(
         local_tree, subpath, local_tree.branch, target_dir, builder=builder
@@ -294,12 +411,11 @@ def prepare_upload_package(  # noqa: C901
     return target_changes['source'], tag_name
 
 
-def select_apt_packages(package_names, maintainer):
+def select_apt_packages(package_names, maintainer, autopkgtest_only=False):
     packages = []
     import apt_pkg
 
-    apt_pkg.init()
-    sources = apt_pkg.SourceRecords()
+    sources = get_apt_source_records()
     while sources.step():
         if maintainer:
             fullname, email = parseaddr(sources.maintainer)
@@ -309,6 +425,11 @@ def select_apt_packages(package_names, maintainer):
         if package_names and sources.package not in package_names:
             continue
 
+        if autopkgtest_only and "Testsuite" not in apt_pkg.TagSection(
+            sources.record
+        ):
+            continue
+
         packages.append(sources.package)
 
     return packages
@@ -318,10 +439,9 @@ def select_vcswatch_packages(
     packages: List[str], maintainer: List[str], autopkgtest_only: bool
 ):
     conn = connect_udd_mirror()
-    cursor = conn.cursor()
     args = []
     query = """\
-    SELECT sources.source, vcswatch.url
+    SELECT sources.source
     FROM vcswatch JOIN sources ON sources.source = vcswatch.source
     WHERE
      vcswatch.status IN ('COMMITS', 'NEW') AND
@@ -336,11 +456,20 @@ def select_vcswatch_packages(
         query += " AND sources.source IN %s"
         args.append(tuple(packages))
 
-    cursor.execute(query, tuple(args))
-
-    packages = []
-    for package, vcs_url in cursor.fetchall():
-        packages.append(package)
+    try:
+        # Use a named (server-side) cursor so the results are streamed rather
+        # than loaded all at once.
+        cursor = conn.cursor(name="vcswatch_packages")
+        try:
+            cursor.itersize = 1000
+            cursor.execute(query, tuple(args))
+            packages = [package for (package,) in cursor]
+        finally:
+            cursor.close()
+    finally:
+        # The cursor lives in a transaction; end it rather than leaving the
+        # connection idle in transaction (or aborted) for the rest of the run.
+        conn.rollback()
     return packages
 
 
@@ -428,7 +557,9 @@ def main(argv):  # noqa: C901
             "vcswatch found pending commits."
         )
         if args.maintainer:
-            packages = select_apt_packages(args.packages, args.maintainer)
+            packages = select_apt_packages(
+                args.packages, args.maintainer, args.autopkgtest_only
+            )
         else:
             packages = args.packages
 
@@ -463,6 +594,18 @@ def main(argv):  # noqa: C901
     if len(packages) > 1:
         logging.info("Uploading packages: %s", ", ".join(packages))
 
+    # Set up a single GPG strategy for all packages; resolving the set of
+    # acceptable keys is slow, so only do it once.
+    if args.gpg_verification:
+        gpg_strategy = gpg.GPGStrategy(GlobalStack())
+        if args.acceptable_keys:
+            acceptable_keys = args.acceptable_keys
+        else:
+            acceptable_keys = list(get_maintainer_keys(gpg_strategy.context))
+        gpg_strategy.set_acceptable_keys(",".join(acceptable_keys))
+    else:
+        gpg_strategy = None
+
     for package in packages:
         logging.info("Processing %s", package)
         # Can't use open_packaging_branch here, since we want to use pkg_source
@@ -503,43 +646,63 @@ def main(argv):  # noqa: C901
             main_branch = open_branch(location, probers=probers, name=branch_name)
         except (BranchUnavailable, BranchMissing, BranchUnsupported) as e:
             stats['vcs-inaccessible'] += 1
-            logging.exception("%s: %s", vcs_url, e)
+            logging.error("%s: %s", vcs_url, e)
             ret = 1
             continue
-        with Workspace(main_branch) as ws:
+        if args.min_commit_age and getattr(
+            main_branch.repository, "supports_random_access", True
+        ):
+            # Most packages get skipped because of recent commits; check the
+            # tip before going to the trouble of creating a workspace.
+            try:
+                tip_revision = _get_tip_revision(main_branch)
+            except (BranchUnavailable, BranchMissing, BranchUnsupported) as e:
+                stats['vcs-inaccessible'] += 1
+                logging.error("%s: %s", vcs_url, e)
+                ret = 1
+                continue
+            if tip_revision is not None:
+                try:
+                    check_revision(tip_revision, args.min_commit_age, None)
+                except RecentCommits as e:
+                    stats['recent-commits'] += 1
+                    logging.info(
+                        "%s: Recent commits (%d days), skipping.",
+                        package, e.commit_age
+                    )
+                    continue
+        # The build results only need to live until they've been uploaded.
+        # Nothing is uploaded in dry-run mode, so keep them for inspection.
+        if args.dry_run:
+            build_dir = nullcontext(None)
+        else:
+            build_dir = tempfile.TemporaryDirectory()
+        with Workspace(main_branch) as ws, build_dir as target_dir:
+            debian_path = os.path.join(subpath, "debian")
             if source_name is None:
-                with ControlEditor(
-                    ws.local_tree.abspath(os.path.join(subpath, "debian/control"))
-                ) as ce:
-                    source_name = ce.source["Source"]
-                with ChangelogEditor(
-                    ws.local_tree.abspath(os.path.join(subpath, "debian/changelog"))
-                ) as cle:
-                    source_version = cle[0].version
-                has_testsuite = "Testsuite" in ce.source
+                # Only reading these; no need for the editors' round-trip.
+                with open(
+                    ws.local_tree.abspath(os.path.join(debian_path, "control")), "rb"
+                ) as f:
+                    source = Deb822(f)
+                source_name = source["Source"]
+                has_testsuite = "Testsuite" in source
+                with open(
+                    ws.local_tree.abspath(os.path.join(debian_path, "changelog")), "rb"
+                ) as f:
+                    source_version = Changelog(f, max_blocks=1).version
             if source_name in args.exclude:
                 continue
             if (
                 args.autopkgtest_only
                 and not has_testsuite
-                and not ws.local_tree.has_filename(
-                    os.path.join(subpath, "debian/tests/control")
+                and not os.path.exists(
+                    ws.local_tree.abspath(os.path.join(debian_path, "tests/control"))
                 )
             ):
                 logging.info("%s: Skipping, package has no autopkgtest.", source_name)
                 stats['no-autopkgtest'] += 1
                 continue
-            branch_config = ws.local_tree.branch.get_config_stack()
-            if args.gpg_verification:
-                gpg_strategy = gpg.GPGStrategy(branch_config)
-                if args.acceptable_keys:
-                    acceptable_keys = args.acceptable_keys
-                else:
-                    acceptable_keys = list(get_maintainer_keys(gpg_strategy.context))
-                gpg_strategy.set_acceptable_keys(",".join(acceptable_keys))
-            else:
-                gpg_strategy = None
-
             try:
                 target_changes, tag_name = prepare_upload_package(
                     ws.local_tree,
@@ -550,6 +713,7 @@ def main(argv):  # noqa: C901
                     gpg_strategy=gpg_strategy,
                     min_commit_age=args.min_commit_age,
                     allowed_committers=args.allowed_committer,
+                    target_dir=target_dir,
                 )
             except GbpDchFailed as e:
                 logging.warn("%s: 'gbp dch' failed to run: %s", source_name, e)
@@ -640,6 +804,9 @@ def main(argv):  # noqa: C901
                 continue
             if not args.dry_run:
                 dput_changes(target_changes)
+            else:
+                logging.info(
+                    "%s: Not uploading %s (dry run)", source_name, target_changes)
             if args.diff:
                 sys.stdout.flush()
                 ws.show_diff(sys.stdout.buffer)
@@ -15,9 +15,16 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+import queue
+import threading
 from typing import (
+    Any,
+    Callable,
+    Generator,
     List,
     Optional,
+    Set,
     Tuple,
     Iterator,
 )
@@ -46,11 +53,6 @@ from breezy.propose import (
     SourceNotDerivedFromTarget,
 )
 
-import breezy.plugins.gitlab  # noqa: F401
-import breezy.plugins.github  # noqa: F401
-import breezy.plugins.launchpad  # noqa: F401
-
-
 from .utils import (
     open_branch,
     full_branch_url,
@@ -83,11 +85,9 @@ __all__ = [
     "check_proposal_diff",
     "EmptyMergeProposal",
     "find_existing_proposed",
+    "SourceNotDerivedFromTarget",
 ]
 
-if SourceNotDerivedFromTarget is not None:
-    __all__.append("SourceNotDerivedFromTarget")
-
 
 def enable_tag_pushing(branch: Branch) -> None:
     stack = branch.get_config()
@@ -126,55 +126,213 @@ def merge_directive_changes(
     return directive
 
 
+def _mp_status(mp: MergeProposal) -> str:
+    if mp.is_merged():
+        return "merged"
+    if mp.is_closed():
+        return "closed"
+    return "open"
+
+
+def _iter_instance_mps(
+    instance: Hoster, statuses: List[str]
+) -> Iterator[Tuple[Hoster, MergeProposal, str]]:
+    try:
+        if len(statuses) > 1:
+            # Fetch everything in one go, rather than doing a separate
+            # (paged) query for each status.
+            seen = set()
+            started = False
+            try:
+                for mp in instance.iter_my_proposals(status="all"):
+                    started = True
+                    if mp.url is not None:
+                        if mp.url in seen:
+                            continue
+                        seen.add(mp.url)
+                    status = _mp_status(mp)
+                    if status in statuses:
+                        yield instance, mp, status
+            except (KeyError, ValueError, NotImplementedError):
+                if started:
+                    raise
+                # This hoster doesn't know about the "all" status.
+            else:
+                return
+        for status in statuses:
+            for mp in instance.iter_my_proposals(status=status):
+                yield instance, mp, status
+    except HosterLoginRequired:
+        pass
+
+
+_DONE = object()
+
+
+def _queue_instance_items(
+    instance: Hoster,
+    fn: Callable[[Hoster], Iterator[Any]],
+    results: "queue.Queue[Any]",
+    stop: threading.Event,
+) -> None:
+    try:
+        items = []
+        for item in fn(instance):
+            if stop.is_set():
+                return
+            items.append(item)
+        # Only hand over the items once this thread is done with the hoster,
+        # so the caller can safely use it.
+        results.put(items)
+    finally:
+        results.put(_DONE)
+
+
+def _iter_per_instance(
+    fn: Callable[[Hoster], Iterator[Any]], max_workers: Optional[int] = None
+) -> Generator[Any, None, None]:
+    # Run fn for each hoster instance on a thread of its own, and yield the
+    # items of each instance once fn has finished with it. Hosters talk to
+    # their API over a single transport, so any per-proposal hoster calls
+    # belong in fn, on the thread that owns the instance.
+    instances = list(iter_hoster_instances())
+    if not instances:
+        return
+    if max_workers is None:
+        max_workers = min(32, len(instances))
+    results: "queue.Queue[Any]" = queue.Queue()
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_queue_instance_items, instance, fn, results, stop)
+            for instance in instances
+        ]
+        try:
+            pending = len(futures)
+            while pending:
+                item = results.get()
+                if item is _DONE:
+                    pending -= 1
+                else:
+                    yield from item
+        finally:
+            # Let the workers finish early if the caller stops iterating.
+            stop.set()
+        # Propagate any errors from the workers.
+        for future in futures:
+            future.result()
+
+
 def iter_all_mps(
     statuses: Optional[List[str]] = None,
+    max_workers: Optional[int] = None,
 ) -> Iterator[Tuple[Hoster, MergeProposal, str]]:
-    """iterate over all existing merge proposals."""
+    """iterate over all existing merge proposals.
+
+    The hoster instances are queried concurrently. The proposals from each
+    instance are yielded once its listing is complete, so results are not
+    returned in any particular order.
+
+    Args:
+      statuses: Statuses to look for (defaults to all)
+      max_workers: Maximum number of concurrent queries
+    """
     if statuses is None:
         statuses = ["open", "merged", "closed"]
-    for instance in iter_hoster_instances():
-        for status in statuses:
-            try:
-                for mp in instance.iter_my_proposals(status=status):
-                    yield instance, mp, status
-            except HosterLoginRequired:
-                pass
+    if not statuses:
+        return iter([])
+    wanted = statuses
+    return _iter_per_instance(
+        lambda instance: _iter_instance_mps(instance, wanted), max_workers
+    )
 
 
-def iter_conflicted(
+def _iter_instance_unmergeable(
+    instance: Hoster,
+) -> Iterator[Tuple[Hoster, MergeProposal, str, str]]:
+    for hoster, mp, status in _iter_instance_mps(instance, ["open"]):
+        try:
+            if mp.can_be_merged():
+                continue
+        except (NotImplementedError, AttributeError):
+            # TODO(jelmer): Check some other way that the branch is conflicted?
+            continue
+        yield hoster, mp, mp.get_source_branch_url(), mp.get_target_branch_url()
+
+
+def _check_conflicted(
+    hoster: Hoster,
+    mp: MergeProposal,
+    source_url: str,
+    target_url: str,
     branch_name: str,
+    local: threading.local,
+) -> Optional[Tuple[str, Branch, str, Branch, Hoster, MergeProposal, bool]]:
+    # Transports can't be shared between threads, but can be reused within one.
+    possible_transports: List[Transport]
+    try:
+        possible_transports = local.possible_transports
+    except AttributeError:
+        possible_transports = local.possible_transports = []
+    resume_branch = open_branch(source_url, possible_transports=possible_transports)
+    if resume_branch.name != branch_name and not (  # type: ignore
+        not resume_branch.name and resume_branch.user_url.endswith(branch_name)  # type: ignore
+    ):
+        return None
+    main_branch = open_branch(target_url, possible_transports=possible_transports)
+    # TODO(jelmer): Find out somehow whether we need to modify a subpath?
+    subpath = ""
+    return (
+        full_branch_url(resume_branch),
+        main_branch,
+        subpath,
+        resume_branch,
+        hoster,
+        mp,
+        True,
+    )
+
+
+def iter_conflicted(
+    branch_name: str, max_workers: int = 16
 ) -> Iterator[Tuple[str, Branch, str, Branch, Hoster, MergeProposal, bool]]:
     """Find conflicted branches owned by the current user.
 
+    The merge proposals are checked concurrently, so results are not
+    returned in any particular order.
+
     Args:
       branch_name: Branch name to search for
+      max_workers: Maximum number of branches to open at once
     """
-    possible_transports: List[Transport] = []
-    for hoster, mp, status in iter_all_mps(["open"]):
-        try:
-            if mp.can_be_merged():
-                continue
-        except (NotImplementedError, AttributeError):
-            # TODO(jelmer): Check some other way that the branch is conflicted?
-            continue
-        main_branch = open_branch(
-            mp.get_target_branch_url(), possible_transports=possible_transports
-        )
-        resume_branch = open_branch(
-            mp.get_source_branch_url(), possible_transports=possible_transports
-        )
-        if resume_branch.name != branch_name and not (  # type: ignore
-            not resume_branch.name and resume_branch.user_url.endswith(branch_name)  # type: ignore
-        ):
-            continue
-        # TODO(jelmer): Find out somehow whether we need to modify a subpath?
-        subpath = ""
-        yield (
-            full_branch_url(resume_branch),
-            main_branch,
-            subpath,
-            resume_branch,
-            hoster,
-            mp,
-            True,
-        )
+    local = threading.local()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending: Set["Future[Any]"] = set()
+    # Asking the hoster about each proposal happens on the thread listing
+    # that hoster's proposals; only opening the branches happens here.
+    candidates = _iter_per_instance(_iter_instance_unmergeable)
+    try:
+        for hoster, mp, source_url, target_url in candidates:
+            pending.add(
+                executor.submit(
+                    _check_conflicted,
+                    hoster, mp, source_url, target_url, branch_name, local,
+                )
+            )
+            done = {future for future in pending if future.done()}
+            pending -= done
+            for future in done:
+                result = future.result()
+                if result is not None:
+                    yield result
+        for future in as_completed(pending):
+            pending.discard(future)
+            result = future.result()
+            if result is not None:
+                yield result
+    finally:
+        # Don't wait for checks nobody is interested in anymore.
+        for future in pending:
+            future.cancel()
+        candidates.close()
+        executor.shutdown(wait=True)
@@ -15,7 +15,12 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
+from contextlib import contextmanager
 import logging
+import os
+import subprocess
+import tempfile
+import threading
 from typing import List, Union, Dict, Optional, Tuple, Any, Callable
 
 from breezy.branch import Branch
@@ -76,7 +81,9 @@ SUPPORTED_MODES: List[str] = [
 
 def _tag_selector_from_tags(tags):
     # TODO(jelmer): Select dict
-    return tags.__contains__
+    # The selector is called for every tag in the branch; make lookups O(1)
+    # for lists too.
+    return frozenset(tags).__contains__
 
 
 def push_result(
@@ -326,10 +333,19 @@ def check_proposal_diff(
     if stop_revision is None:
         stop_revision = other_branch.last_revision()
     main_revid = main_branch.last_revision()
-    other_branch.repository.fetch(main_branch.repository, main_revid)
+    if stop_revision == main_revid:
+        raise EmptyMergeProposal(other_branch, main_branch)
+    # The main revision is often present already, e.g. when the local branch
+    # was just sprouted from it.
+    if not other_branch.repository.has_revision(main_revid):
+        other_branch.repository.fetch(main_branch.repository, main_revid)
     with other_branch.lock_read():
-        main_tree = other_branch.repository.revision_tree(main_revid)
         revision_graph = other_branch.repository.get_graph()
+        if revision_graph.is_ancestor(stop_revision, main_revid):
+            # Everything that would be proposed has already been merged;
+            # no need to build a preview of the merge.
+            raise EmptyMergeProposal(other_branch, main_branch)
+        main_tree = other_branch.repository.revision_tree(main_revid)
         tree_branch = MemoryBranch(other_branch.repository, (None, main_revid), None)
         merger = _mod_merge.Merger(
             tree_branch, this_tree=main_tree, revision_graph=revision_graph
@@ -496,6 +512,102 @@ def find_existing_proposed(
                     return (None, False, None)
 
 
+# The merge hooks are global state; serialize any code that swaps them out.
+_merge_hooks_lock = threading.Lock()
+
+
+@contextmanager
+def _disabled_file_content_mergers():
+    """Temporarily disable any custom merge_file_content hooks."""
+    with _merge_hooks_lock:
+        old_file_content_mergers = _mod_merge.Merger.hooks["merge_file_content"]
+        _mod_merge.Merger.hooks["merge_file_content"] = []
+        try:
+            yield
+        finally:
+            _mod_merge.Merger.hooks["merge_file_content"] = old_file_content_mergers
+
+
+def _git_merge_conflicts(
+    repository, main_revid: bytes, other_revid: bytes
+) -> Optional[bool]:
+    """Check whether two revisions conflict using "git merge-tree".
+
+    This avoids building a preview transform. Like the breezy code path,
+    custom merge drivers are not used, so the result matches what
+    git-based hosting sites report.
+
+    Returns:
+      boolean indicating whether there are conflicts, or None if git could
+      not answer the question
+    """
+    from breezy.git.repository import LocalGitRepository
+
+    if not isinstance(repository, LocalGitRepository):
+        return None
+    try:
+        main_sha = repository.lookup_bzr_revision_id(main_revid)[0]
+        other_sha = repository.lookup_bzr_revision_id(other_revid)[0]
+    except errors.NoSuchRevision:
+        return None
+    try:
+        git_dir = repository._git.controldir()
+    except errors.NotLocalUrl:
+        return None
+    env = dict(os.environ)
+    # Ignore merge drivers and attributes from the user's and the system's
+    # configuration.
+    env["GIT_CONFIG_NOSYSTEM"] = "1"
+    env["GIT_CONFIG_GLOBAL"] = os.devnull
+    env.pop("GIT_DIR", None)
+    env.pop("GIT_WORK_TREE", None)
+    git = ["git", "--git-dir=.", "-c", "core.attributesFile=%s" % os.devnull]
+    try:
+        p = subprocess.run(
+            git + ["config", "--get-regexp", r"^merge\..*\.driver$"],
+            cwd=git_dir,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    except FileNotFoundError:
+        return None
+    if p.returncode != 1:
+        # The repository configures its own merge drivers (or git failed);
+        # let the breezy merge code, which ignores them, decide.
+        return None
+    with tempfile.TemporaryDirectory() as objects_dir:
+        # Keep the objects written by --write-tree out of the repository.
+        env["GIT_OBJECT_DIRECTORY"] = objects_dir
+        env["GIT_ALTERNATE_OBJECT_DIRECTORIES"] = os.path.join(
+            os.path.abspath(git_dir), "objects"
+        )
+        p = subprocess.run(
+            git
+            + [
+                "merge-tree",
+                "--write-tree",
+                "--name-only",
+                "--no-messages",
+                other_sha.decode("ascii"),
+                main_sha.decode("ascii"),
+            ],
+            cwd=git_dir,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    if p.returncode == 0:
+        return False
+    if p.returncode == 1:
+        return True
+    # Anything else means git could not do the merge (older git without
+    # --write-tree, unrelated histories, ...)
+    return None
+
+
 def merge_conflicts(
     main_branch: Branch, other_branch: Branch, other_revision: Optional[bytes] = None
 ) -> bool:
@@ -511,27 +623,28 @@ def merge_conflicts(
     """
     if other_revision is None:
         other_revision = other_branch.last_revision()
-    if other_branch.repository.get_graph().is_ancestor(
-        main_branch.last_revision(), other_revision
-    ):
+    main_revid = main_branch.last_revision()
+    if other_branch.repository.get_graph().is_ancestor(main_revid, other_revision):
         return False
 
-    other_branch.repository.fetch(
-        main_branch.repository, revision_id=main_branch.last_revision()
+    if not other_branch.repository.has_revision(main_revid):
+        other_branch.repository.fetch(main_branch.repository, revision_id=main_revid)
+
+    conflicted = _git_merge_conflicts(
+        other_branch.repository, main_revid, other_revision
     )
+    if conflicted is not None:
+        return conflicted
 
+    other_tree = other_branch.repository.revision_tree(other_revision)
     # Reset custom merge hooks, since they could make it harder to detect
     # conflicted merges that would appear on the hosting site.
-    old_file_content_mergers = _mod_merge.Merger.hooks["merge_file_content"]
-    _mod_merge.Merger.hooks["merge_file_content"] = []
-
-    other_tree = other_branch.repository.revision_tree(other_revision)
-    try:
+    with _disabled_file_content_mergers():
         try:
             merger = _mod_merge.Merger.from_revision_ids(
                 other_tree,
                 other_branch=other_branch,
-                other=main_branch.last_revision(),
+                other=main_revid,
                 tree_branch=other_branch,
             )
         except errors.UnrelatedBranches:
@@ -542,8 +655,6 @@ def merge_conflicts(
         tree_merger = merger.make_merger()
         with tree_merger.make_preview_transform():
             return bool(tree_merger.cooked_conflicts)
-    finally:
-        _mod_merge.Merger.hooks["merge_file_content"] = old_file_content_mergers
 
 
 class PublishResult(object):
@@ -613,7 +724,10 @@ def publish_changes(
     if stop_revision is None:
         stop_revision = local_branch.last_revision()
 
-    if stop_revision == main_branch.last_revision():
+    # Looking up the tip of a remote branch may involve a round trip.
+    main_revid = main_branch.last_revision()
+
+    if stop_revision == main_revid:
         if existing_proposal is not None:
             logging.info("closing existing merge proposal - no new revisions")
             existing_proposal.close()
@@ -646,7 +760,7 @@ def publish_changes(
             # breezy would do this check too, but we want to be *really* sure.
             with local_branch.lock_read():
                 graph = local_branch.repository.get_graph()
-                if not graph.is_ancestor(main_branch.last_revision(), stop_revision):
+                if not graph.is_ancestor(main_revid, stop_revision):
                     raise errors.DivergedBranches(main_branch, local_branch)
             push_changes(
                 local_branch,
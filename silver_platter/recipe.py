@@ -16,11 +16,18 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 from dataclasses import dataclass
+from functools import lru_cache
 from jinja2 import Template
 from typing import Optional, Dict, Union, List
 import yaml
 
 
+@lru_cache(maxsize=None)
+def _compile_template(source: str) -> Template:
+    # Recipes are rendered once per candidate; only parse each template once.
+    return Template(source)
+
+
 @dataclass
 class Recipe(object):
     """Recipe to use."""
@@ -60,17 +67,16 @@ class Recipe(object):
     def render_merge_request_commit_message(self, context):
         template = self.merge_request_commit_message_template
         if template:
-            return Template(template).render(context)
+            return _compile_template(template).render(context)
         return None
 
     def render_merge_request_description(self, description_format, context):
         template = self.merge_request_description_template.get(description_format)
         if template is None:
-            try:
-                template = self.merge_request_description_template[None]
-            except KeyError:
+            template = self.merge_request_description_template.get(None)
+            if template is None:
                 return None
-        return Template(template).render(context)
+        return _compile_template(template).render(context)
 
     @classmethod
     def from_path(cls, path):
@@ -18,16 +18,18 @@
 """Automatic proposal/push creation."""
 
 import argparse
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import itertools
 import logging
-import os
 import subprocess
 import sys
-from typing import Optional, List
+from pathlib import PurePosixPath
+import threading
+from typing import Iterable, Optional, List, Set
 
-from breezy import osutils
 from breezy import propose as _mod_propose
-
-import silver_platter  # noqa: F401
+from breezy.propose import Hoster
+from breezy.transport import Transport
 
 from .apply import script_runner, ScriptMadeNoChanges, ScriptFailed
 from .proposal import (
@@ -52,8 +54,11 @@ from .utils import (
 )
 
 
+_diff_lock = threading.Lock()
+
+
 def derived_branch_name(script: str) -> str:
-    return os.path.splitext(osutils.basename(script.split(" ")[0]))[0]
+    return PurePosixPath(script.split(" ", 1)[0]).stem
 
 
 def apply_and_publish(  # noqa: C901
@@ -63,17 +68,19 @@ def apply_and_publish(  # noqa: C901
         verify_command: Optional[str] = None,
         derived_owner: Optional[str] = None,
         refresh: bool = False, allow_create_proposal=None,
-        get_commit_message=None, get_description=None):
+        get_commit_message=None, get_description=None,
+        possible_hosters: Optional[List[Hoster]] = None,
+        possible_transports: Optional[List[Transport]] = None):
     try:
-        main_branch = open_branch(url)
+        main_branch = open_branch(url, possible_transports=possible_transports)
     except (BranchUnavailable, BranchMissing, BranchUnsupported) as e:
-        logging.exception("%s: %s", url, e)
+        logging.error("%s: %s", url, e)
         return 2
 
     overwrite = False
 
     try:
-        hoster = get_hoster(main_branch)
+        hoster = get_hoster(main_branch, possible_hosters=possible_hosters)
     except UnsupportedHoster as e:
         if mode != "push":
             raise
@@ -133,7 +140,7 @@ def apply_and_publish(  # noqa: C901
                 existing_proposal=existing_proposal,
             )
         except UnsupportedHoster as e:
-            logging.exception(
+            logging.error(
                 "No known supported hoster for %s. Run 'svp login'?",
                 full_branch_url(e.branch),
             )
@@ -142,7 +149,7 @@ def apply_and_publish(  # noqa: C901
             logging.info('Insufficient changes for a new merge proposal')
             return 1
         except _mod_propose.HosterLoginRequired as e:
-            logging.exception(
+            logging.error(
                 "Credentials for hosting site at %r missing. " "Run 'svp login'?",
                 e.hoster.base_url,
             )
@@ -158,7 +165,10 @@ def apply_and_publish(  # noqa: C901
             logging.info("Description: %s", publish_result.proposal.get_description())
 
         if diff:
-            ws.show_diff(sys.stdout.buffer)
+            # Keep diffs of URLs processed concurrently (--jobs) from
+            # interleaving.
+            with _diff_lock:
+                ws.show_diff(sys.stdout.buffer)
 
         return 1
 
@@ -210,6 +220,10 @@ def main(argv: List[str]) -> Optional[int]:  # noqa: C901
         "--recipe", type=str, help="Recipe to use.")
     parser.add_argument(
         "--candidates", type=str, help="File with candidate list.")
+    parser.add_argument(
+        "--jobs", type=int, default=1,
+        help="Number of URLs to process concurrently. "
+             "Diffs (--diff) are written one URL at a time.")
     args = parser.parse_args(argv)
 
     if args.recipe:
@@ -221,7 +235,7 @@ def main(argv: List[str]) -> Optional[int]:  # noqa: C901
     if not args.url and not args.candidates:
         parser.error("url or candidates are required")
 
-    urls = []
+    urls: Iterable[str] = []
 
     if args.url:
         urls = [args.url]
@@ -229,7 +243,8 @@ def main(argv: List[str]) -> Optional[int]:  # noqa: C901
     if args.candidates:
         from .candidates import CandidateList
         candidatelist = CandidateList.from_path(args.candidates)
-        urls.extend([candidate.url for candidate in candidatelist])
+        urls = itertools.chain(
+            urls, (candidate.url for candidate in candidatelist))
 
     if args.commit_pending:
         commit_pending = {"auto": None, "yes": True, "no": False}[args.commit_pending]
@@ -243,7 +258,7 @@ def main(argv: List[str]) -> Optional[int]:  # noqa: C901
     elif recipe.command:
         command = recipe.command
     else:
-        logging.exception('No command specified.')
+        logging.error('No command specified.')
         return 1
 
     if args.name is not None:
@@ -286,16 +301,52 @@ def main(argv: List[str]) -> Optional[int]:  # noqa: C901
 
     retcode = 0
 
-    for url in urls:
-        result = apply_and_publish(
+    # Candidates tend to share a hosting site; reuse hosters and connections
+    # found for earlier URLs rather than probing again for each one. Hosters
+    # hold a transport of their own, so neither can be shared between threads.
+    local = threading.local()
+
+    def process(url):
+        try:
+            possible_hosters = local.possible_hosters
+            possible_transports = local.possible_transports
+        except AttributeError:
+            possible_hosters = local.possible_hosters = []
+            possible_transports = local.possible_transports = []
+        return apply_and_publish(
                 url, name=name, command=command, mode=args.mode,
                 commit_pending=commit_pending, dry_run=args.dry_run,
                 labels=args.label, diff=args.diff,
                 derived_owner=args.derived_owner, refresh=refresh,
                 allow_create_proposal=allow_create_proposal,
                 get_commit_message=get_commit_message,
-                get_description=get_description)
-        retcode = max(retcode, result)
+                get_description=get_description,
+                possible_hosters=possible_hosters,
+                possible_transports=possible_transports)
+
+    if args.jobs > 1:
+        # Each URL gets its own branch and workspace, and most of the time is
+        # spent waiting on the network or the script.
+        executor = ThreadPoolExecutor(max_workers=args.jobs)
+        pending: Set["Future[int]"] = set()
+        try:
+            # Only take the next URL once a worker is free, and stop at the
+            # first error, like the sequential loop.
+            for url in urls:
+                if len(pending) >= args.jobs:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        retcode = max(retcode, future.result())
+                pending.add(executor.submit(process, url))
+            for future in wait(pending).done:
+                retcode = max(retcode, future.result())
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+    else:
+        for url in urls:
+            retcode = max(retcode, process(url))
 
     return retcode
 
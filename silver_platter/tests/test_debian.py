@@ -16,6 +16,7 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 from datetime import datetime
+import os
 
 from debian.changelog import ChangelogCreateError
 
@@ -36,6 +37,8 @@ from ..debian import (
     UnsupportedVCSProber,
     add_changelog_entry,
 )
+from ..debian.uploader import _get_tip_revision, get_maintainer_keys
+from ..utils import BranchUnavailable
 
 
 class SelectProbersTests(TestCase):
@@ -450,3 +453,83 @@ lintian-brush (0.35) unstable; urgency=medium
 """,
             "debian/changelog",
         )
+
+
+class DummyKey(object):
+    def __init__(self, fpr, subkeys=()):
+        self.fpr = fpr
+        self.keyid = fpr[-16:]
+        self.subkeys = list(subkeys)
+
+
+class DummyGPGContext(object):
+    def __init__(self, keys):
+        self.keys = keys
+        self.listed = []
+
+    def keylist(self, source):
+        self.listed.append(source)
+        return iter(self.keys)
+
+
+class GetMaintainerKeysTests(TestCaseWithTransport):
+    def setUp(self):
+        super(GetMaintainerKeysTests, self).setUp()
+        self.overrideEnv("XDG_CACHE_HOME", os.path.abspath("cache"))
+        self.build_tree_contents([("keyring.gpg", b"keyring")])
+        subkey = DummyKey("B" * 40)
+        self.context = DummyGPGContext([DummyKey("A" * 40, [subkey])])
+
+    def test_cached(self):
+        expected = ["A" * 40, "B" * 16]
+        self.assertEqual(expected, get_maintainer_keys(self.context, "keyring.gpg"))
+        self.assertEqual(expected, get_maintainer_keys(self.context, "keyring.gpg"))
+        self.assertEqual(["keyring.gpg"], self.context.listed)
+        self.assertEqual(1, len(os.listdir("cache/silver-platter")))
+
+    def test_keyring_changed(self):
+        get_maintainer_keys(self.context, "keyring.gpg")
+        self.build_tree_contents([("keyring.gpg", b"updated keyring")])
+        self.context.keys = [DummyKey("C" * 40)]
+        self.assertEqual(["C" * 40], get_maintainer_keys(self.context, "keyring.gpg"))
+        self.assertEqual(["keyring.gpg", "keyring.gpg"], self.context.listed)
+        # The entry for the old keyring is removed.
+        self.assertEqual(1, len(os.listdir("cache/silver-platter")))
+
+    def test_cache_not_writable(self):
+        self.build_tree_contents([("cache", b"not a directory")])
+        self.assertEqual(
+            ["A" * 40, "B" * 16], get_maintainer_keys(self.context, "keyring.gpg")
+        )
+
+    def test_failed_write_cleans_up(self):
+        def replace(src, dst):
+            raise PermissionError(dst)
+
+        self.overrideAttr(os, "replace", replace)
+        self.assertEqual(
+            ["A" * 40, "B" * 16], get_maintainer_keys(self.context, "keyring.gpg")
+        )
+        self.assertEqual([], os.listdir("cache/silver-platter"))
+
+
+class GetTipRevisionTests(TestCaseWithTransport):
+    def test_empty(self):
+        for format in ["git", "2a"]:
+            branch = self.make_branch("empty-" + format, format=format)
+            self.assertIs(None, _get_tip_revision(branch))
+
+    def test_tip(self):
+        tree = self.make_branch_and_tree("tree")
+        revid = tree.commit("A change")
+        self.assertEqual(revid, _get_tip_revision(tree.branch).revision_id)
+
+    def test_unavailable(self):
+        tree = self.make_branch_and_tree("tree")
+        tree.commit("A change")
+
+        def get_revision(revid):
+            raise breezy.errors.ConnectionError("connection reset")
+
+        self.overrideAttr(tree.branch.repository, "get_revision", get_revision)
+        self.assertRaises(BranchUnavailable, _get_tip_revision, tree.branch)
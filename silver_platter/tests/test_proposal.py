@@ -15,11 +15,17 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
+import gc
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 import os
+import threading
 
-from breezy.tests import TestCaseWithTransport
+from breezy import diff as _mod_diff
+from breezy.propose import HosterLoginRequired
+from breezy.tests import TestCase, TestCaseWithTransport
 
+from .. import proposal as _mod_proposal
 from ..workspace import (
     Workspace,
 )
@@ -93,3 +99,238 @@ class WorkspaceTests(TestCaseWithTransport):
             f = BytesIO()
             ws.show_diff(outf=f)
             self.assertContainsRe(f.getvalue().decode("utf-8"), "\\+some content")
+
+    def test_show_diff_unbuffered(self):
+        b = self.make_branch_and_tree("target")
+        with Workspace(b.branch, dir=self.test_dir) as ws:
+            self.build_tree_contents(
+                [(os.path.join(ws.local_tree.basedir, "foo"), "some content\n")]
+            )
+            ws.local_tree.add(["foo"])
+            ws.local_tree.commit("blah")
+            with open("diff", "wb", buffering=0) as f:
+                ws.show_diff(outf=f)
+                self.assertFalse(f.closed)
+            with open("diff", "rb") as f:
+                self.assertContainsRe(f.read().decode("utf-8"), "\\+some content")
+
+    def test_show_diff_unbuffered_error(self):
+        b = self.make_branch_and_tree("target")
+
+        def show_diff_trees(old_tree, new_tree, to_file, **kwargs):
+            to_file.write(b"partial\n")
+            raise OSError("diff failed")
+
+        self.overrideAttr(_mod_diff, "show_diff_trees", show_diff_trees)
+        with Workspace(b.branch, dir=self.test_dir) as ws:
+            with open("diff", "wb", buffering=0) as f:
+                self.assertRaises(OSError, ws.show_diff, outf=f)
+                gc.collect()
+                self.assertFalse(f.closed)
+            with open("diff", "rb") as f:
+                self.assertEqual(b"partial\n", f.read())
+
+
+class DummyProposal(object):
+    def __init__(self, url, status):
+        self.url = url
+        self.status = status
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, self.url)
+
+    def is_merged(self):
+        return self.status == "merged"
+
+    def is_closed(self):
+        return self.status == "closed"
+
+
+class DummyInstance(object):
+    def __init__(self, proposals, supports_all=True):
+        self.proposals = proposals
+        self.supports_all = supports_all
+        self.queried = []
+
+    def iter_my_proposals(self, status):
+        self.queried.append(status)
+        if self.proposals is None:
+            raise HosterLoginRequired(self)
+        if status == "all":
+            if not self.supports_all:
+                raise KeyError(status)
+            return iter(self.proposals)
+        return iter([mp for mp in self.proposals if mp.status == status])
+
+
+class IterAllMpsTests(TestCase):
+    def test_combines_instances(self):
+        a1 = DummyProposal("https://a/1", "open")
+        a2 = DummyProposal("https://a/2", "merged")
+        c1 = DummyProposal("https://c/1", "closed")
+        a = DummyInstance([a1, a2])
+        b = DummyInstance(None)
+        c = DummyInstance([c1], supports_all=False)
+        self.overrideAttr(
+            _mod_proposal, "iter_hoster_instances", lambda: iter([a, b, c])
+        )
+        self.assertEqual(
+            sorted(
+                [(a, a1, "open"), (a, a2, "merged"), (c, c1, "closed")], key=repr
+            ),
+            sorted(_mod_proposal.iter_all_mps(), key=repr),
+        )
+        self.assertEqual(["all"], a.queried)
+        self.assertEqual(["all", "open", "merged", "closed"], c.queried)
+
+    def test_single_status(self):
+        a1 = DummyProposal("https://a/1", "open")
+        a2 = DummyProposal("https://a/2", "merged")
+        a = DummyInstance([a1, a2])
+        self.overrideAttr(_mod_proposal, "iter_hoster_instances", lambda: iter([a]))
+        self.assertEqual(
+            [(a, a1, "open")], list(_mod_proposal.iter_all_mps(["open"]))
+        )
+        self.assertEqual(["open"], a.queried)
+
+    def test_no_instances(self):
+        self.overrideAttr(_mod_proposal, "iter_hoster_instances", lambda: iter([]))
+        self.assertEqual([], list(_mod_proposal.iter_all_mps()))
+
+    def test_listing_finished_before_yield(self):
+        a1 = DummyProposal("https://a/1", "open")
+        a2 = DummyProposal("https://a/2", "open")
+        finished = []
+
+        class Instance(DummyInstance):
+            def iter_my_proposals(self, status):
+                yield from super(Instance, self).iter_my_proposals(status)
+                finished.append(status)
+
+        a = Instance([a1, a2])
+        self.overrideAttr(_mod_proposal, "iter_hoster_instances", lambda: iter([a]))
+        mps = _mod_proposal.iter_all_mps(["open"])
+        self.assertEqual((a, a1, "open"), next(mps))
+        # The hoster is no longer in use by the listing thread.
+        self.assertEqual(["open"], finished)
+        self.assertEqual([(a, a2, "open")], list(mps))
+
+
+class ConflictedProposal(DummyProposal):
+    def __init__(self, url, source_url, target_url, calls):
+        super(ConflictedProposal, self).__init__(url, "open")
+        self.source_url = source_url
+        self.target_url = target_url
+        self.calls = calls
+
+    def can_be_merged(self):
+        self.calls.append(("can_be_merged", threading.get_ident()))
+        return False
+
+    def get_source_branch_url(self):
+        self.calls.append(("get_source_branch_url", threading.get_ident()))
+        return self.source_url
+
+    def get_target_branch_url(self):
+        self.calls.append(("get_target_branch_url", threading.get_ident()))
+        return self.target_url
+
+
+class ListingInstance(DummyInstance):
+    def iter_my_proposals(self, status):
+        self.thread = threading.get_ident()
+        return super(ListingInstance, self).iter_my_proposals(status)
+
+
+class DummyBranch(object):
+    def __init__(self, url):
+        self.user_url = url
+        self.name = url.rsplit("/", 1)[-1]
+
+
+class IterConflictedTests(TestCase):
+    def setUp(self):
+        super(IterConflictedTests, self).setUp()
+        self.calls = []
+        self.opened = []
+        self.overrideAttr(_mod_proposal, "open_branch", self.open_branch)
+        self.overrideAttr(_mod_proposal, "full_branch_url", lambda b: b.user_url)
+
+    def open_branch(self, url, possible_transports=None):
+        self.opened.append(url)
+        return DummyBranch(url)
+
+    def make_proposal(self, name):
+        return ConflictedProposal(
+            "https://a/" + name, "https://a/" + name, "https://a/target",
+            self.calls
+        )
+
+    def test_filters_on_branch_name(self):
+        mp1 = self.make_proposal("x/foo")
+        mp2 = self.make_proposal("x/bar")
+        mergeable = DummyProposal("https://a/3", "open")
+        mergeable.can_be_merged = lambda: True
+        a = ListingInstance([mp1, mp2, mergeable])
+        self.overrideAttr(_mod_proposal, "iter_hoster_instances", lambda: iter([a]))
+        results = list(_mod_proposal.iter_conflicted("foo"))
+        self.assertEqual([mp1], [result[5] for result in results])
+        self.assertEqual("https://a/x/foo", results[0][0])
+        self.assertEqual("https://a/target", results[0][1].user_url)
+        # The target is only opened for the matching proposal.
+        self.assertEqual(
+            ["https://a/target", "https://a/x/bar", "https://a/x/foo"],
+            sorted(self.opened),
+        )
+        # The hoster is only used from the thread listing its proposals.
+        self.assertEqual({a.thread}, {ident for (name, ident) in self.calls})
+
+    def test_close_cancels_pending(self):
+        mps = [self.make_proposal("x%d/foo" % i) for i in range(5)]
+        all_submitted = threading.Event()
+        second_started = threading.Event()
+        shutting_down = threading.Event()
+        release = threading.Event()
+
+        def iter_per_instance(fn):
+            for mp in mps:
+                yield None, mp, mp.source_url, mp.target_url
+            # iter_conflicted only asks for more once it has submitted the
+            # check for the previous proposal.
+            all_submitted.set()
+
+        class Executor(ThreadPoolExecutor):
+            def shutdown(self, *args, **kwargs):
+                shutting_down.set()
+                super(Executor, self).shutdown(*args, **kwargs)
+
+        def open_branch(url, possible_transports=None):
+            if url == "https://a/x0/foo":
+                all_submitted.wait()
+            elif url == "https://a/x1/foo":
+                second_started.set()
+                release.wait()
+            return self.open_branch(url)
+
+        self.overrideAttr(_mod_proposal, "_iter_per_instance", iter_per_instance)
+        self.overrideAttr(_mod_proposal, "ThreadPoolExecutor", Executor)
+        self.overrideAttr(_mod_proposal, "open_branch", open_branch)
+        results = _mod_proposal.iter_conflicted("foo", max_workers=1)
+        self.assertEqual("https://a/x0/foo", next(results)[0])
+        second_started.wait()
+        # close() waits for the running check, so call it from another thread
+        # and only let that check finish once the pending ones are cancelled.
+        closer = threading.Thread(target=results.close)
+        closer.start()
+        shutting_down.wait()
+        release.set()
+        closer.join()
+        self.assertEqual(
+            [
+                "https://a/x0/foo",
+                "https://a/target",
+                "https://a/x1/foo",
+                "https://a/target",
+            ],
+            self.opened,
+        )
@@ -15,11 +15,16 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
+import os
+
+from breezy.errors import NotLocalUrl
 from breezy.tests import TestCaseWithTransport
 
 from ..publish import (
     EmptyMergeProposal,
+    _git_merge_conflicts,
     check_proposal_diff,
+    merge_conflicts,
     push_result,
 )
 
@@ -107,3 +112,108 @@ class CheckProposalDiffGitTests(TestCaseWithTransport, CheckProposalDiffBase):
 class CheckProposalDiffBzrTests(TestCaseWithTransport, CheckProposalDiffBase):
 
     format = "bzr"
+
+
+class MergeConflictsBase(object):
+    def make_diverged(self, main_contents, other_contents):
+        main = self.make_branch_and_tree("main", format=self.format)
+        self.build_tree_contents([("main/a", "a\n")])
+        main.add(["a"])
+        main.commit("initial")
+        other = main.controldir.sprout("other").open_workingtree()
+        self.build_tree_contents([("main/a", main_contents)])
+        main.commit("change in main")
+        self.build_tree_contents([("other/a", other_contents)])
+        other.commit("change in other")
+        self.addCleanup(other.lock_write().unlock)
+        return main.branch, other.branch
+
+    def test_ancestor(self):
+        main = self.make_branch_and_tree("main", format=self.format)
+        main.commit("initial")
+        other = main.controldir.sprout("other").open_workingtree()
+        other.commit("another")
+        self.addCleanup(other.lock_write().unlock)
+        self.assertFalse(merge_conflicts(main.branch, other.branch))
+
+    def test_clean(self):
+        main, other = self.make_diverged("a\n", "a\nb\n")
+        self.assertFalse(merge_conflicts(main, other))
+
+    def test_conflicted(self):
+        main, other = self.make_diverged("main\n", "other\n")
+        self.assertTrue(merge_conflicts(main, other))
+
+
+class MergeConflictsGitTests(TestCaseWithTransport, MergeConflictsBase):
+
+    format = "git"
+
+    def configure_merge_driver(self, config_path):
+        # A driver that always keeps "our" side, and so never conflicts.
+        with open(config_path, "a") as f:
+            f.write('[merge "keepmine"]\n\tdriver = true\n')
+        os.makedirs("other/.git/info", exist_ok=True)
+        with open("other/.git/info/attributes", "w") as f:
+            f.write("a merge=keepmine\n")
+
+    def test_global_merge_driver_ignored(self):
+        main, other = self.make_diverged("main\n", "other\n")
+        self.configure_merge_driver(os.path.join(os.environ["HOME"], ".gitconfig"))
+        self.assertIs(
+            True,
+            _git_merge_conflicts(
+                other.repository, main.last_revision(), other.last_revision()
+            ),
+        )
+        self.assertTrue(merge_conflicts(main, other))
+
+    def test_repository_merge_driver_ignored(self):
+        main, other = self.make_diverged("main\n", "other\n")
+        self.configure_merge_driver("other/.git/config")
+        self.assertIs(
+            None,
+            _git_merge_conflicts(
+                other.repository, main.last_revision(), other.last_revision()
+            ),
+        )
+        self.assertTrue(merge_conflicts(main, other))
+
+    def test_not_local(self):
+        main, other = self.make_diverged("main\n", "other\n")
+
+        def controldir():
+            raise NotLocalUrl(other.user_url)
+
+        self.overrideAttr(other.repository._git, "controldir", controldir)
+        self.assertIs(
+            None,
+            _git_merge_conflicts(
+                other.repository, main.last_revision(), other.last_revision()
+            ),
+        )
+
+    def test_no_objects_written(self):
+        main, other = self.make_diverged("a\nmain\n", "other\na\n")
+
+        def list_objects():
+            return sorted(
+                os.path.join(dirpath, name)
+                for (dirpath, dirnames, filenames) in os.walk("other/.git/objects")
+                for name in filenames
+            )
+
+        other.repository.fetch(main.repository, revision_id=main.last_revision())
+        before = list_objects()
+        self.assertIs(
+            False,
+            _git_merge_conflicts(
+                other.repository, main.last_revision(), other.last_revision()
+            ),
+        )
+        self.assertEqual(before, list_objects())
+
+
+class MergeConflictsBzrTests(TestCaseWithTransport, MergeConflictsBase):
+
+    format = "bzr"
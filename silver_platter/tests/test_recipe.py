@@ -32,3 +32,25 @@ resume: true
 """)])
         recipe = Recipe.from_path('recipe.yaml')
         self.assertEqual(recipe.name, 'foo')
+
+    def test_render_description(self):
+        self.build_tree_contents([('recipe.yaml', """\
+---
+name: foo
+merge-request:
+  description:
+    markdown: "Fix **{{ name }}**"
+    plain: "Fix {{ name }}"
+""")])
+        recipe = Recipe.from_path('recipe.yaml')
+        self.assertEqual(
+            'Fix **bar**',
+            recipe.render_merge_request_description('markdown', {'name': 'bar'}))
+        self.assertEqual(
+            'Fix **baz**',
+            recipe.render_merge_request_description('markdown', {'name': 'baz'}))
+        self.assertEqual(
+            'Fix bar',
+            recipe.render_merge_request_description('plain', {'name': 'bar'}))
+        self.assertIs(
+            None, recipe.render_merge_request_description('html', {}))
@@ -16,13 +16,16 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 import os
+import threading
 
 from breezy.tests import (
     TestCaseWithTransport,
 )
 
+from .. import run as _mod_run
 from ..run import (
     ScriptMadeNoChanges,
+    derived_branch_name,
     script_runner,
 )
 
@@ -100,3 +103,61 @@ echo "Some message"
             os.path.abspath("foo.sh"),
             commit_pending=True,
         )
+
+
+class DerivedBranchNameTests(TestCaseWithTransport):
+    def test_script(self):
+        self.assertEqual("foo", derived_branch_name("foo.sh"))
+
+    def test_path_with_arguments(self):
+        self.assertEqual("fix-typo", derived_branch_name("/usr/bin/fix-typo.py --all"))
+
+    def test_no_extension(self):
+        self.assertEqual("lintian-brush", derived_branch_name("lintian-brush"))
+
+
+class JobsTests(TestCaseWithTransport):
+    def setUp(self):
+        super(JobsTests, self).setUp()
+        self.urls = ["https://example.com/%d" % i for i in range(5)]
+        self.build_tree_contents(
+            [("candidates.yaml", "".join("- url: %s\n" % url for url in self.urls))]
+        )
+        self.started = []
+
+    def run_main(self, apply_and_publish):
+        self.overrideAttr(_mod_run, "apply_and_publish", apply_and_publish)
+        return _mod_run.main(
+            ["--candidates=candidates.yaml", "--command=true", "--jobs=2"]
+        )
+
+    def test_all_urls(self):
+        def apply_and_publish(url, **kwargs):
+            self.started.append(url)
+            return 1 if url == self.urls[2] else 0
+
+        self.assertEqual(1, self.run_main(apply_and_publish))
+        self.assertEqual(sorted(self.urls), sorted(self.started))
+
+    def test_stops_at_error(self):
+        second_started = threading.Event()
+        shutting_down = threading.Event()
+
+        class Executor(_mod_run.ThreadPoolExecutor):
+            def shutdown(self, *args, **kwargs):
+                shutting_down.set()
+                super(Executor, self).shutdown(*args, **kwargs)
+
+        def apply_and_publish(url, **kwargs):
+            self.started.append(url)
+            if url == self.urls[0]:
+                second_started.wait()
+                raise ValueError(url)
+            second_started.set()
+            # Still busy when the failure is noticed.
+            shutting_down.wait()
+            return 0
+
+        self.overrideAttr(_mod_run, "ThreadPoolExecutor", Executor)
+        self.assertRaises(ValueError, self.run_main, apply_and_publish)
+        self.assertEqual(self.urls[:2], sorted(self.started))
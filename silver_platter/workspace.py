@@ -15,13 +15,13 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
+import io
 import logging
 from typing import Optional, Callable, List, Union, Dict, BinaryIO, Any, Tuple, Iterator
 
 from breezy.branch import Branch
 from breezy.tree import Tree
 from breezy.workingtree import WorkingTree
-from breezy.diff import show_diff_trees
 from breezy.errors import (
     DivergedBranches,
     NotBranchError,
@@ -373,14 +373,30 @@ class Workspace(object):
     def show_diff(
         self, outf: BinaryIO, old_label: str = "old/", new_label: str = "new/"
     ) -> None:
+        from breezy.diff import show_diff_trees
+
         base_tree = self.base_tree()
-        show_diff_trees(
-            base_tree,
-            self.local_tree.basis_tree(),
-            outf,
-            old_label=old_label,
-            new_label=new_label,
-        )
+        # The diff is written in many small chunks; avoid a write call for
+        # each of them on unbuffered streams.
+        buffered: Optional[io.BufferedWriter] = None
+        buf: BinaryIO
+        if isinstance(outf, io.RawIOBase):
+            buf = buffered = io.BufferedWriter(outf, buffer_size=65536)
+        else:
+            buf = outf
+        try:
+            show_diff_trees(
+                base_tree,
+                self.local_tree.basis_tree(),
+                buf,
+                old_label=old_label,
+                new_label=new_label,
+            )
+        finally:
+            if buffered is not None:
+                # Don't let the wrapper close the caller's stream, even if
+                # the diff failed halfway.
+                buffered.detach()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self._destroy: